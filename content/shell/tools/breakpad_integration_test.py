@@ -11,48 +11,102 @@ well as that the tools can symbolize a stack trace."""
 
 
 import glob
+import itertools
 import json
+import multiprocessing
 import optparse
 import os
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
-import time
 
 
 CONCURRENT_TASKS=4
-BREAKPAD_TOOLS_DIR = os.path.join(
+GENERATE_SYMBOLS_TIMEOUT = 60 * 60
+BREAKPAD_TOOLS_DIR = os.path.normpath(os.path.join(
   os.path.dirname(__file__), '..', '..', '..',
-  'components', 'crash', 'content', 'tools')
+  'components', 'crash', 'content', 'tools'))
+_DMP_TO_MINIDUMP = os.path.join(BREAKPAD_TOOLS_DIR, 'dmp2minidump.py')
+_GENERATE_SYMBOLS = os.path.join(BREAKPAD_TOOLS_DIR,
+                                 'generate_breakpad_symbols.py')
 ANDROID_CRASH_DIR = '/data/local/tmp/crashes'
 
 def build_is_android(build_dir):
   return os.path.isfile(os.path.join(build_dir, 'bin', 'content_shell_apk'))
 
-def android_crash_dir_exists():
-  proc = subprocess.Popen(['adb', 'shell', 'ls', ANDROID_CRASH_DIR],
-                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-  [stdout, stderr] = proc.communicate()
-  not_found = 'No such file or directory'
-  return not_found not in stdout and not_found not in stderr
-
-def get_android_dump(crash_dir):
+class AdbShell(object):
+  """A persistent `adb shell` session.
+
+  Spawning `adb shell` for every device-side command pays the adb connection
+  and shell startup cost each time, so commands are instead written to a
+  single long-lived shell and their output is read back up to a sentinel."""
+
+  # Devices without adb shell_v2 always get a PTY, which echoes the input
+  # back. The sentinel is split with quotes in the command so that only the
+  # shell's output, and not the echoed command, matches it.
+  _SENTINEL_COMMAND = 'echo __EO""F__$?'
+  _SENTINEL_RE = re.compile(r'__EOF__(\d+)\s*$')
+
+  def __init__(self):
+    self._proc = subprocess.Popen(['adb', 'shell'], stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE, bufsize=1)
+
+  def run(self, cmd):
+    """Runs |cmd| in the shell and returns (returncode, output lines).
+
+    On a PTY the output lines also include the echoed command and prompt."""
+    self._proc.stdin.write('{ %s; } 2>&1; %s\n' % (cmd, self._SENTINEL_COMMAND))
+    self._proc.stdin.flush()
+    output = []
+    while True:
+      line = self._proc.stdout.readline()
+      if not line:
+        raise Exception('adb shell exited while running: %s' % cmd)
+      match = self._SENTINEL_RE.search(line)
+      if match:
+        if match.start():
+          output.append(line[:match.start()])
+        return int(match.group(1)), output
+      output.append(line.rstrip('\r\n'))
+
+  def check_call(self, cmd):
+    returncode, output = self.run(cmd)
+    if returncode:
+      raise subprocess.CalledProcessError(returncode, cmd, '\n'.join(output))
+
+  def close(self):
+    if self._proc.poll() is None:
+      try:
+        self._proc.stdin.write('exit\n')
+        self._proc.stdin.close()
+      except IOError:
+        # The shell has already gone away.
+        pass
+      self._proc.wait()
+
+def android_crash_dir_exists(adb_shell):
+  returncode, _ = adb_shell.run('test -d ' + ANDROID_CRASH_DIR)
+  return returncode == 0
+
+def get_android_dump(adb_shell, crash_dir):
   global failure
 
   pending = ANDROID_CRASH_DIR + '/pending/'
 
-  for attempts in range(5):
-    proc = subprocess.Popen(
-        ['adb', 'shell', 'ls', pending + '*.dmp'],
-    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    dumps = [f for f in map(str.strip, proc.communicate()[0].split('\n'))
-             if f.endswith('.dmp')]
-    if len(dumps) > 0:
-      break
-    # Crashpad may still be writing the dump. Sleep and try again.
-    time.sleep(1)
+  # Crashpad may still be writing the dump, so poll for it on the device for
+  # up to 5 seconds rather than round-tripping through adb for each attempt.
+  _, output = adb_shell.run(
+      'for i in 1 2 3 4 5; do '
+      'f=$(ls %s*.dmp 2>/dev/null); '
+      'if [ -n "$f" ]; then echo "$f"; break; fi; '
+      'sleep 1; '
+      'done' % pending)
+  # Match the dump paths themselves, since on a PTY the output also contains
+  # the echoed command and shell prompt.
+  dump_re = re.compile(re.escape(pending) + r'[^\s*]+\.dmp')
+  dumps = [m.group(0) for m in map(dump_re.search, output) if m]
 
   if len(dumps) != 1:
     failure = 'Expected 1 crash dump, found %d.' % len(dumps)
@@ -60,12 +114,52 @@ def get_android_dump(crash_dir):
     raise Exception(failure)
 
   subprocess.check_call(['adb', 'pull', dumps[0], crash_dir])
-  subprocess.check_call(['adb', 'shell', 'rm', pending + '*'])
+  adb_shell.check_call('rm -f ' + pending + '*')
 
   return os.path.join(crash_dir, os.path.basename(dumps[0]))
 
-def run_test(options, crash_dir, symbols_dir, platform,
-             additional_arguments = []):
+def _generate_one(args):
+  """Runs generate_breakpad_symbols.py for a single binary and returns its exit
+  code.
+
+  Takes an (options, symbols_dir, binary, jobs) tuple so it can be used with
+  multiprocessing.Pool.map_async. The exit code is returned rather than raised
+  because CalledProcessError can't be pickled back from a worker on Python 2,
+  which leaves the pool waiting forever."""
+  options, symbols_dir, binary, jobs = args
+  cmd = [_GENERATE_SYMBOLS,
+         '--build-dir=%s' % options.build_dir,
+         '--binary=%s' % binary,
+         '--symbols-dir=%s' % symbols_dir,
+         '--jobs=%d' % jobs]
+  if options.verbose:
+    cmd.append('--verbose')
+    print ' '.join(cmd)
+  return subprocess.call(cmd)
+
+def find_crash_symbol(cmd, keep_stack, null_file):
+  """Runs the symbolizer |cmd| and returns (found_symbol, stack).
+
+  The output is scanned line by line for CrashIntentionally. Unless
+  |keep_stack| is set, the symbolizer is killed at the first match and the
+  returned stack is empty. stderr is discarded into |null_file|."""
+  found_symbol = False
+  lines = []
+  proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=null_file)
+  for line in iter(proc.stdout.readline, ''):
+    if keep_stack:
+      lines.append(line)
+    if 'CrashIntentionally' in line:
+      found_symbol = True
+      if not keep_stack:
+        proc.kill()
+        break
+  proc.stdout.close()
+  proc.wait()
+  return found_symbol, ''.join(lines)
+
+def run_test(options, crash_dir, symbols_dir, platform, null_file,
+             additional_arguments = [], adb_shell = None):
   global failure
 
   print '# Run content_shell and make it crash.'
@@ -89,14 +183,11 @@ def run_test(options, crash_dir, symbols_dir, platform,
   if options.verbose:
     subprocess.check_call(cmd)
   else:
-    # On Windows, using os.devnull can cause check_call to never return,
-    # so use a temporary file for the output.
-    with tempfile.TemporaryFile() as tmpfile:
-      subprocess.check_call(cmd, stdout=tmpfile, stderr=tmpfile)
+    subprocess.check_call(cmd, stdout=null_file, stderr=null_file)
 
   print '# Retrieve crash dump.'
   if platform == 'android':
-    dmp_file = get_android_dump(crash_dir)
+    dmp_file = get_android_dump(adb_shell, crash_dir)
   else:
     dmp_dir = crash_dir
     # TODO(crbug.com/782923): This test should not reach directly into the
@@ -106,16 +197,19 @@ def run_test(options, crash_dir, symbols_dir, platform,
     elif platform == 'win32':
       dmp_dir = os.path.join(dmp_dir, 'reports')
 
-    dmp_files = glob.glob(os.path.join(dmp_dir, '*.dmp'))
-    failure = 'Expected 1 crash dump, found %d.' % len(dmp_files)
+    # Only look for a second dump, which is enough to tell that there isn't
+    # exactly one.
+    dmp_files = list(itertools.islice(
+        glob.iglob(os.path.join(dmp_dir, '*.dmp')), 2))
+    failure = 'Expected 1 crash dump, found %s.' % (
+        'more than 1' if len(dmp_files) > 1 else len(dmp_files))
     if len(dmp_files) != 1:
       raise Exception(failure)
     dmp_file = dmp_files[0]
 
   if platform not in ('darwin', 'win32', 'android'):
     minidump = os.path.join(crash_dir, 'minidump')
-    dmp_to_minidump = os.path.join(BREAKPAD_TOOLS_DIR, 'dmp2minidump.py')
-    cmd = [dmp_to_minidump, dmp_file, minidump]
+    cmd = [_DMP_TO_MINIDUMP, dmp_file, minidump]
     if options.verbose:
       print ' '.join(cmd)
     failure = 'Failed to run dmp_to_minidump.'
@@ -131,21 +225,15 @@ def run_test(options, crash_dir, symbols_dir, platform,
     if options.verbose:
       print ' '.join(cmd)
     failure = 'Failed to run cdb.exe.'
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE)
-    stack = proc.communicate()[0]
   else:
     minidump_stackwalk = os.path.join(options.build_dir, 'minidump_stackwalk')
     cmd = [minidump_stackwalk, minidump, symbols_dir]
     if options.verbose:
       print ' '.join(cmd)
     failure = 'Failed to run minidump_stackwalk.'
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE)
-    stack = proc.communicate()[0]
 
   # Check whether the stack contains a CrashIntentionally symbol.
-  found_symbol = 'CrashIntentionally' in stack
+  found_symbol, stack = find_crash_symbol(cmd, options.verbose, null_file)
 
   os.remove(dmp_file)
 
@@ -200,15 +288,11 @@ def main():
     return 1
 
   failure = ''
+  adb_shell = None
+  created_android_crash_dir = False
 
   if build_is_android(options.build_dir):
     platform = 'android'
-    if android_crash_dir_exists():
-      print 'Android crash dir exists %s' % ANDROID_CRASH_DIR
-      return 1
-
-    subprocess.check_call(['adb', 'shell', 'mkdir', ANDROID_CRASH_DIR])
-
   else:
     platform = sys.platform
 
@@ -218,27 +302,51 @@ def main():
 
   crash_service = None
 
+  # Discarded subprocess output all goes to this one file. On Windows, using
+  # os.devnull can cause check_call to never return, so use a temporary file.
+  if sys.platform == 'win32':
+    null_file = tempfile.TemporaryFile()
+  else:
+    null_file = open(os.devnull, 'wb')
+
   try:
+    if platform == 'android':
+      failure = 'Failed to set up android crash dir %s.' % ANDROID_CRASH_DIR
+      adb_shell = AdbShell()
+      if android_crash_dir_exists(adb_shell):
+        failure = 'Android crash dir exists %s' % ANDROID_CRASH_DIR
+        raise Exception(failure)
+      adb_shell.check_call('mkdir ' + ANDROID_CRASH_DIR)
+      created_android_crash_dir = True
+
     if platform != 'win32':
       print '# Generate symbols.'
       bins = [options.binary]
       if options.additional_binary:
         bins.append(options.additional_binary)
-      generate_symbols = os.path.join(
-          BREAKPAD_TOOLS_DIR, 'generate_breakpad_symbols.py')
-      for binary in bins:
-        cmd = [generate_symbols,
-               '--build-dir=%s' % options.build_dir,
-               '--binary=%s' % binary,
-               '--symbols-dir=%s' % symbols_dir,
-               '--jobs=%d' % options.jobs]
-        if options.verbose:
-          cmd.append('--verbose')
-          print ' '.join(cmd)
-        failure = 'Failed to run generate_breakpad_symbols.py.'
-        subprocess.check_call(cmd)
-
-    run_test(options, crash_dir, symbols_dir, platform)
+      failure = 'Failed to run generate_breakpad_symbols.py.'
+      if len(bins) == 1:
+        returncodes = [_generate_one(
+            (options, symbols_dir, bins[0], options.jobs))]
+      else:
+        # Generate the symbols for all binaries concurrently, splitting the
+        # job budget between them. Waiting with a timeout keeps Ctrl-C working
+        # on Python 2.
+        jobs_per_binary = max(1, options.jobs // len(bins))
+        jobs = [(options, symbols_dir, binary, jobs_per_binary)
+                for binary in bins]
+        pool = multiprocessing.Pool(processes=len(bins))
+        try:
+          returncodes = pool.map_async(_generate_one, jobs).get(
+              GENERATE_SYMBOLS_TIMEOUT)
+        finally:
+          pool.terminate()
+          pool.join()
+      if any(returncodes):
+        raise Exception(failure)
+
+    run_test(options, crash_dir, symbols_dir, platform, null_file,
+             adb_shell=adb_shell)
 
   except:
     print 'FAIL: %s' % failure
@@ -256,6 +364,7 @@ def main():
     return 0
 
   finally:
+    null_file.close()
     if crash_service:
       crash_service.terminate()
       crash_service.wait()
@@ -263,11 +372,13 @@ def main():
       shutil.rmtree(crash_dir)
     except:
       print 'Failed to delete temp directory "%s".' % crash_dir
-    if platform == 'android':
+    if created_android_crash_dir:
       try:
-        subprocess.check_call(['adb', 'shell', 'rm', '-rf', ANDROID_CRASH_DIR])
+        adb_shell.check_call('rm -rf ' + ANDROID_CRASH_DIR)
       except:
         print 'Failed to delete android crash dir %s' % ANDROID_CRASH_DIR
+    if adb_shell:
+      adb_shell.close()
 
 
 if '__main__' == __name__:
@@ -38,15 +38,13 @@ _form_factors = [
   'tablet',
 ]
 
-# Convert a platform argument to the matching Platform enum value in
+# Maps a platform argument to the matching Platform enum value in
 # components/variations/proto/study.proto.
-def _PlatformEnumValue(platform):
-  assert platform in _platforms
-  return 'Study::PLATFORM_' + platform.upper()
+_PLATFORM_ENUM = dict((p, 'Study::PLATFORM_' + p.upper()) for p in _platforms)
 
-def _FormFactorEnumValue(form_factor):
-  assert form_factor in _form_factors
-  return 'Study::' + form_factor.upper()
+# Maps a form factor to the matching FormFactor enum value in
+# components/variations/proto/study.proto.
+_FORM_FACTOR_ENUM = dict((f, 'Study::' + f.upper()) for f in _form_factors)
 
 def _Load(filename):
   """Loads a JSON file into a Python object and return this object.
@@ -61,15 +59,23 @@ def _LoadFieldTrialConfig(filename, platforms):
   """
   return _FieldTrialConfigToDescription(_Load(filename), platforms)
 
-def _CreateExperiment(experiment_data,
-                      platforms,
-                      is_low_end_device,
-                      form_factors):
+# The fields shared by the experiments of a config that sets neither
+# is_low_end_device nor form_factors, which is the common case. Templates hold
+# tuples so they can be shared; each experiment gets its own lists.
+_DEFAULT_EXPERIMENT_TEMPLATE = {
+  'is_low_end_device': 'Study::OPTIONAL_BOOL_MISSING',
+  'form_factors': (),
+}
+
+def _CreateExperiment(experiment_data, template):
+  """Returns the experiment for |experiment_data|. |template| holds the fields
+  shared by all experiments of a config.
+  """
   experiment = {
     'name': experiment_data['name'],
-    'platforms': [_PlatformEnumValue(p) for p in platforms],
-    'is_low_end_device': is_low_end_device,
-    'form_factors': [_FormFactorEnumValue(f) for f in form_factors],
+    'platforms': list(template['platforms']),
+    'is_low_end_device': template['is_low_end_device'],
+    'form_factors': list(template['form_factors']),
   }
   forcing_flags_data = experiment_data.get('forcing_flag')
   if forcing_flags_data:
@@ -95,19 +101,27 @@ def _CreateTrial(study_name, experiment_configs, platforms):
   experiments = []
   for config in experiment_configs:
     platform_intersection = [p for p in platforms if p in config['platforms']]
-    is_low_end_device = 'Study::OPTIONAL_BOOL_MISSING'
-    if 'is_low_end_device' in config:
-      is_low_end_device = ('Study::OPTIONAL_BOOL_TRUE'
-                           if config['is_low_end_device']
-                           else 'Study::OPTIONAL_BOOL_FALSE')
-
-    if platform_intersection:
-      experiments += [_CreateExperiment(
-                          e,
-                          platform_intersection,
-                          is_low_end_device,
-                          config.get('form_factors', []))
-                      for e in config['experiments']]
+    if not platform_intersection:
+      continue
+
+    if 'is_low_end_device' not in config and 'form_factors' not in config:
+      template = dict(_DEFAULT_EXPERIMENT_TEMPLATE)
+    else:
+      is_low_end_device = 'Study::OPTIONAL_BOOL_MISSING'
+      if 'is_low_end_device' in config:
+        is_low_end_device = ('Study::OPTIONAL_BOOL_TRUE'
+                             if config['is_low_end_device']
+                             else 'Study::OPTIONAL_BOOL_FALSE')
+      template = {
+        'is_low_end_device': is_low_end_device,
+        'form_factors': tuple(_FORM_FACTOR_ENUM[f]
+                              for f in config.get('form_factors', [])),
+      }
+    template['platforms'] = tuple(_PLATFORM_ENUM[p]
+                                  for p in platform_intersection)
+
+    experiments += [_CreateExperiment(e, template)
+                    for e in config['experiments']]
   return {
     'name': study_name,
     'experiments': experiments,
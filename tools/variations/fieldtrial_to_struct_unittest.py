@@ -2,6 +2,8 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import difflib
+import filecmp
 import unittest
 
 import fieldtrial_to_struct
@@ -10,12 +12,22 @@ import os
 
 class FieldTrialToStruct(unittest.TestCase):
 
+  # Handle test being run from the current directory.
+  _BASE_PATH = os.path.dirname(__file__) or '.'
+
   def FullRelativePath(self, relative_path):
-    base_path = os.path.dirname(__file__)
-    if not base_path:
-      # Handle test being run from the current directory.
-      base_path = '.'
-    return base_path + relative_path
+    return self._BASE_PATH + relative_path
+
+  def assertFilesEqual(self, expected_filename, actual_filename):
+    """Compares the files chunk by chunk and only reads them in full to show a
+    diff when they differ."""
+    if filecmp.cmp(expected_filename, actual_filename, shallow=False):
+      return
+    with open(expected_filename, 'r') as expected:
+      with open(actual_filename, 'r') as actual:
+        self.fail(''.join(difflib.unified_diff(
+            expected.readlines(), actual.readlines(),
+            expected_filename, actual_filename)))
 
   def test_FieldTrialToDescription(self):
     config = {
@@ -312,19 +324,13 @@ class FieldTrialToStruct(unittest.TestCase):
       unittest_data_dir + 'test_config.json'
     ])
     header_filename = test_output_filename + '.h'
-    with open(header_filename, 'r') as header:
-      test_header = header.read()
-      with open(unittest_data_dir + 'expected_output.h', 'r') as expected:
-        expected_header = expected.read()
-        self.assertEqual(expected_header, test_header)
+    self.assertFilesEqual(unittest_data_dir + 'expected_output.h',
+                          header_filename)
     os.unlink(header_filename)
 
     cc_filename = test_output_filename + '.cc'
-    with open(cc_filename, 'r') as cc:
-      test_cc = cc.read()
-      with open(unittest_data_dir + 'expected_output.cc', 'r') as expected:
-        expected_cc = expected.read()
-        self.assertEqual(expected_cc, test_cc)
+    self.assertFilesEqual(unittest_data_dir + 'expected_output.cc',
+                          cc_filename)
     os.unlink(cc_filename)
 
 if __name__ == '__main__':